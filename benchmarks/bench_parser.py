@@ -0,0 +1,120 @@
+"""
+Compares the streaming bulletin parser with the previous resp.json() based parsing.
+
+The streaming parser keeps a much lower peak memory, since the whole payload is never held as a list of dicts,
+and the parsing overlaps with the download. Its CPU time per bulletin is in the same range as the previous loop,
+either one may come out ahead depending on the machine and the bulletin, see the output of this script for the
+numbers.
+
+Usage:
+    python -m benchmarks.bench_parser [recorded_bulletin.json ...]
+
+Recorded bulletins can be saved with e.g.
+    curl -k https://www.ktb.org.tr/api/v1/Alpha.WebPanel/OnlineKullaniciBulten/GetAnlikBulten/2024-09-02 > bulletin.json
+When no file is given, a large bulletin is generated instead.
+"""
+import json
+import random
+import sys
+import timeit
+import tracemalloc
+
+from src.parser import BulletinParser
+
+CHUNK_SIZE = 64 * 1024
+
+
+def generate_bulletin(group_count: int = 200, products_per_group: int = 50) -> bytes:
+    rows = []
+
+    for group in range(group_count):
+        for product in range(products_per_group):
+            price = random.uniform(5, 20)
+            rows.append({
+                "UrunGrubu": f"ÜRÜN {group}-{product}",
+                "TopMiktar": random.randint(1_000, 500_000),
+                "MaxFiyat": f"{price * 1.1:.4f}".replace(".", ","),
+                "MinFiyat": f"{price * 0.9:.4f}".replace(".", ","),
+                "AvgFiyat": f"{price:.4f}".replace(".", ","),
+                "GrupAdi": f"GRUP {group}",
+                "GrupMaxFiyat": int(price * 1.2 * 10**4),
+                "GrupMinFiyat": int(price * 0.8 * 10**4),
+                "GrupOrtFiyat": int(price * 10**4)
+            })
+
+    return json.dumps(rows, ensure_ascii=False).encode()
+
+
+def parse_with_json(payload: bytes) -> dict:
+    # The loop of Helper.fetch_prices as it was before the streaming parser, unchanged
+    groups = dict()
+    product_list: list[dict] = json.loads(payload)
+
+    for product in product_list:
+        product_name = product["UrunGrubu"]
+        product_quantity = product["TopMiktar"]
+        product_max_price = float(product["MaxFiyat"].replace(',', '.'))
+        product_min_price = float(product["MinFiyat"].replace(',', '.'))
+        product_avg_price = float(product["AvgFiyat"].replace(',', '.'))
+
+        group_name = product["GrupAdi"]
+        group_max_price = product["GrupMaxFiyat"] / 10**4
+        group_min_price = product["GrupMinFiyat"] / 10**4
+        group_avg_price = product["GrupOrtFiyat"] / 10**4
+
+        if group_name not in groups:
+            groups[group_name] = {
+                "products": [],
+                "group_max_price": group_max_price,
+                "group_min_price": group_min_price,
+                "group_avg_price": group_avg_price,
+                "group_quantity": 0
+            }
+
+        groups[group_name]["products"].append({
+            "name": product_name,
+            "quantity": product_quantity,
+            "max_price": product_max_price,
+            "min_price": product_min_price,
+            "avg_price": product_avg_price
+        })
+        groups[group_name]["group_quantity"] += product_quantity
+
+    return groups
+
+
+def parse_with_stream(payload: bytes) -> dict:
+    parser = BulletinParser()
+
+    for start in range(0, len(payload), CHUNK_SIZE):
+        parser.feed(payload[start:start + CHUNK_SIZE])
+
+    return parser.close()
+
+
+def bench(name: str, payload: bytes) -> None:
+    print(f"{name}: {len(payload) / 1024:.0f} KiB")
+
+    for parse in (parse_with_json, parse_with_stream):
+        runs, total = timeit.Timer(lambda: parse(payload)).autorange()
+
+        tracemalloc.start()
+        parse(payload)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"  {parse.__name__:<20} {total / runs * 1000:8.2f} ms  {peak / 1024:8.0f} KiB peak")
+
+
+def main() -> None:
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            with open(path, "rb") as f:
+                bench(path, f.read())
+    else:
+        random.seed(0)
+        bench("generated bulletin", generate_bulletin())
+
+
+if __name__ == "__main__":
+    main()
@@ -32,10 +32,30 @@ def validate():
         print("ERROR: Please make sure time configurations are correct. Hours and minutes list must be same size!")
         exit(-1)
 
+    if config.NOTIFICATION_BUCKET_MINUTES < 1 or (24 * 60) % config.NOTIFICATION_BUCKET_MINUTES:
+        print("ERROR: Please make sure NOTIFICATION_BUCKET_MINUTES divides a day into equal buckets!")
+        exit(-1)
+
+    if not config.MAX_MESSAGES_PER_SECOND:
+        print("ERROR: Please configure MAX_MESSAGES_PER_SECOND")
+        exit(-1)
+
+    if not config.BROADCAST_RESUME_INTERVAL:
+        print("ERROR: Please configure BROADCAST_RESUME_INTERVAL")
+        exit(-1)
+
+    if config.BROADCAST_LEASE_SECONDS < 3:
+        print("ERROR: Please make sure BROADCAST_LEASE_SECONDS is at least 3 seconds!")
+        exit(-1)
+
     if not config.PRICE_UPDATE_INTERVAL:
         print("ERROR: Please configure PRICE_UPDATE_INTERVAL")
         exit(-1)
 
+    if config.MAX_CONCURRENT_UPDATES < 1 or config.MAX_PENDING_UPDATES < config.MAX_CONCURRENT_UPDATES:
+        print("ERROR: Please make sure MAX_CONCURRENT_UPDATES is positive and MAX_PENDING_UPDATES isn't less than it!")
+        exit(-1)
+
     if config.WEBHOOK_CONNECTED:
         if not config.WEBHOOK_URL or config.WEBHOOK_URL == f"/{config.TELEGRAM_API_TOKEN}":
             print("ERROR: Please make sure you configured a WEBHOOK_URL if you are using webhook rather than polling!")
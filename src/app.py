@@ -6,7 +6,7 @@ from .config import (
     MONGODB_URI,
     DATABASE_NAME
 )
-from .models import PriceRecord, User
+from .models import Broadcast, PriceRecord, PriceStatistics, User
 
 # Logging
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
@@ -17,3 +17,5 @@ client = AsyncIOMotorClient(MONGODB_URI)
 db = client[DATABASE_NAME]
 PriceRecord.initialize_collection(db, "price-records")
 User.initialize_collection(db, "users")
+PriceStatistics.initialize_collection(db, "price-statistics")
+Broadcast.initialize_collection(db, "broadcasts")
@@ -1,14 +1,32 @@
 import datetime
 
-import pytz
 from telegram import Update
-from telegram.ext import Application, CommandHandler, ConversationHandler, MessageHandler, filters, TypeHandler
+from telegram.ext import (
+    Application,
+    CommandHandler,
+    ConversationHandler,
+    InlineQueryHandler,
+    MessageHandler,
+    filters,
+    TypeHandler
+)
 
-from . import config, handler, task
+from . import config, handler, scheduler, task
+from .dispatcher import OrderedApplication
 
 
 def main() -> None:
-    app: Application = Application.builder().token(config.TELEGRAM_API_TOKEN).build()
+    # OrderedApplication does the actual limiting, PTB's own limit only needs some headroom over it so that the
+    # updates exceeding MAX_PENDING_UPDATES reach it and get a busy message rather than waiting silently.
+    app: Application = (Application.builder()
+                        .token(config.TELEGRAM_API_TOKEN)
+                        .application_class(OrderedApplication,
+                                           kwargs={"max_concurrent_updates": config.MAX_CONCURRENT_UPDATES,
+                                                   "max_pending_updates": config.MAX_PENDING_UPDATES,
+                                                   "busy_message": handler.BUSY_MESSAGE})
+                        .concurrent_updates(config.MAX_PENDING_UPDATES + config.MAX_CONCURRENT_UPDATES)
+                        .post_init(scheduler.load_wheel)
+                        .build())
 
     app.add_handler(CommandHandler("start", handler.start), group=1)
     app.add_handler(CommandHandler("yardim", handler.help_), group=1)
@@ -16,9 +34,13 @@ def main() -> None:
     app.add_handler(CommandHandler("son_7_gun", handler.last_7_days), group=1)
     app.add_handler(CommandHandler("son_15_gun", handler.last_15_days), group=1)
     app.add_handler(CommandHandler("son_30_gun", handler.last_30_days), group=1)
+    app.add_handler(CommandHandler("istatistik", handler.send_statistics), group=1)
     app.add_handler(CommandHandler("bildirim_kapat", handler.disable_notifier), group=1)
     app.add_handler(CommandHandler("bildirim_ac", handler.enable_notifier), group=1)
+    app.add_handler(CommandHandler("bildirim_saatleri", handler.set_notification_times), group=1)
     app.add_handler(CommandHandler("bagis", handler.donate), group=1)
+    app.add_handler(CommandHandler("admin_profil", handler.admin_profile), group=1)
+    app.add_handler(InlineQueryHandler(handler.inline_prices), group=1)
 
     # In python-telegram-bot, handlers have something called group. It means that whenever there is
     # a new update from Telegram, this update runs through each of these groups. This update can be
@@ -64,11 +86,13 @@ def main() -> None:
     app.job_queue.run_repeating(callback=task.update_prices,
                                 interval=config.PRICE_UPDATE_INTERVAL,
                                 first=5)
+    app.job_queue.run_repeating(callback=task.resume_broadcasts,
+                                interval=config.BROADCAST_RESUME_INTERVAL,
+                                first=0)
 
-    for i in range(len(config.PRICE_CHECK_HOURS)):
-        hour, minute = config.PRICE_CHECK_HOURS[i], config.PRICE_CHECK_MINUTES[i]
-        app.job_queue.run_daily(callback=task.check_and_notify_prices,
-                                time=datetime.time(hour=hour, minute=minute, tzinfo=pytz.timezone("Europe/Istanbul")))
+    app.job_queue.run_repeating(callback=task.check_and_notify_prices,
+                                interval=datetime.timedelta(minutes=config.NOTIFICATION_BUCKET_MINUTES),
+                                first=scheduler.wheel.next_tick(datetime.datetime.now(scheduler.TIMEZONE)))
 
     if config.WEBHOOK_CONNECTED:
         app.run_webhook(listen=config.WEBHOOK_BIND,
@@ -23,6 +23,28 @@ PRICE_CHECK_HOURS: list[int] = config.get("PRICE_CHECK_HOURS", [10, 15])
 PRICE_CHECK_MINUTES: list[int] = config.get("PRICE_CHECK_MINUTES", [0, 0])
 PRICE_UPDATE_INTERVAL: int = config.get("PRICE_UPDATE_INTERVAL", 3600)
 
+# Notifications are grouped into buckets of this many minutes and spread over the bucket, PRICE_CHECK_HOURS and
+# PRICE_CHECK_MINUTES are used for the users who didn't choose their own notification times
+NOTIFICATION_BUCKET_MINUTES: int = config.get("NOTIFICATION_BUCKET_MINUTES", 15)
+MAX_MESSAGES_PER_SECOND: int = config.get("MAX_MESSAGES_PER_SECOND", 25)
+
+# Broadcasts are checkpointed every BROADCAST_BATCH_SIZE deliveries, recipients are split into BROADCAST_SHARDS
+BROADCAST_BATCH_SIZE: int = config.get("BROADCAST_BATCH_SIZE", 50)
+BROADCAST_SHARDS: int = config.get("BROADCAST_SHARDS", 1)
+# Deliveries failing with network errors are retried this many times, unfinished broadcasts are looked for and
+# resumed every BROADCAST_RESUME_INTERVAL seconds
+BROADCAST_MAX_RETRIES: int = config.get("BROADCAST_MAX_RETRIES", 3)
+BROADCAST_RESUME_INTERVAL: int = config.get("BROADCAST_RESUME_INTERVAL", 60)
+# A shard is claimed by one process at a time, others can take it over if it isn't renewed for this many seconds
+BROADCAST_LEASE_SECONDS: int = config.get("BROADCAST_LEASE_SECONDS", 300)
+
+# How long Telegram may cache the answer of an inline query, in seconds
+INLINE_CACHE_TIME: int = config.get("INLINE_CACHE_TIME", 300)
+
+# Concurrent update handling, updates of the same chat are still handled one by one
+MAX_CONCURRENT_UPDATES: int = config.get("MAX_CONCURRENT_UPDATES", 8)
+MAX_PENDING_UPDATES: int = config.get("MAX_PENDING_UPDATES", 100)
+
 # Polling or Webhook?
 WEBHOOK_CONNECTED: bool = config.get("WEBHOOK_CONNECTED", False)
 PORT: int = config.get("PORT", 9999)
@@ -0,0 +1,79 @@
+import asyncio
+
+import telegram
+from telegram import Update
+from telegram.ext import Application
+
+from .app import logger
+from .profiler import profiler
+
+
+class OrderedApplication(Application):
+    """
+    An Application that handles updates concurrently while keeping the updates of a single chat in order.
+
+    python-telegram-bot only offers a global semaphore for concurrent updates, which would let two updates of the
+    same chat race each other. That breaks ConversationHandler, since the second message of a conversation could be
+    handled before the first one moved the conversation into the next state. So every chat gets its own lock, and
+    a separate semaphore limits how many updates are actually being worked on.
+
+    When too many updates are waiting, new ones are rejected right away with a busy message instead of piling up.
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int, busy_message: str, **kwargs):
+        super().__init__(**kwargs)
+        self.max_pending_updates = max_pending_updates
+        self.busy_message = busy_message
+        self.pending_updates = 0
+        self.worker_semaphore = asyncio.Semaphore(max_concurrent_updates)
+        self.chat_locks: dict[int, list] = {}
+
+    async def process_update(self, update: object) -> None:
+        chat = update.effective_chat if isinstance(update, Update) else None
+
+        if self.pending_updates >= self.max_pending_updates:
+            await self.reject_update(update)
+            return
+
+        if chat is None:
+            self.pending_updates += 1
+
+            try:
+                async with self.worker_semaphore:
+                    await self.handle_update(update)
+            finally:
+                self.pending_updates -= 1
+
+            return
+
+        # Each entry is [lock, number of updates holding a reference], so the lock can be dropped when unused.
+        entry = self.chat_locks.setdefault(chat.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        self.pending_updates += 1
+
+        try:
+            async with entry[0], self.worker_semaphore:
+                await self.handle_update(update)
+        finally:
+            self.pending_updates -= 1
+            entry[1] -= 1
+
+            if entry[1] == 0:
+                del self.chat_locks[chat.id]
+
+    async def handle_update(self, update: object) -> None:
+        if profiler.remaining_updates:
+            await profiler.profile_update(super().process_update, update)
+        else:
+            await super().process_update(update)
+
+    async def reject_update(self, update: object) -> None:
+        logger.warning(f"Too many pending updates ({self.pending_updates}), dropping an update.")
+
+        if not isinstance(update, Update) or not update.effective_message or not update.effective_chat:
+            return
+
+        try:
+            await self.bot.send_message(chat_id=update.effective_chat.id, text=self.busy_message)
+        except telegram.error.TelegramError:
+            logger.warning(f"Busy message couldn't be delivered to {update.effective_chat.id}")
@@ -7,10 +7,15 @@ import telegram
 from telegram import Update
 from telegram.ext import ContextTypes
 
-from . import config
+from . import config, scheduler, snapshot, stats, task
 from .app import PriceRecord, User, logger
+from .profiler import profiler
+from .snapshot import normalize
 from .utils import Helper
 
+BUSY_MESSAGE = "Şu anda çok yoğunum, lütfen birkaç saniye sonra tekrar dene."
+MAX_NOTIFICATION_TIMES = 5
+
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     telegram_user = update.effective_user
@@ -25,6 +30,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                         language=telegram_user.language_code,
                         dnd=False)
         await new_user.save()
+        scheduler.wheel.add(new_user.user_id, new_user.notification_times)
 
     await context.bot.send_message(chat_id=str(telegram_user.id),
                                    text="Hoş geldin! Konya Ticaret Borsasından anlık fiyatları öğrenmek için doğru "
@@ -35,12 +41,18 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 async def help_(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await context.bot.send_message(chat_id=update.effective_user.id,
                                    text="/fiyatlar - Anlık fiyat tablosu\n"
+                                        "/fiyatlar ozet - Anlık fiyatların kısa özeti\n"
+                                        "/fiyatlar <ürün> - Sadece istediğin ürünün fiyatları\n"
                                         "/son_7_gun - Son 7 güne ait ortalama fiyat grafiği\n"
                                         "/son_15_gun - Son 15 güne ait ortalama fiyat grafiği\n"
                                         "/son_30_gun - Son 30 güne ait ortalama fiyat grafiği\n"
+                                        "/istatistik - Son 7, 30 ve 90 günün fiyat istatistikleri\n"
                                         "/bildirim_kapat - Otomatik bildirimleri kapat\n"
                                         "/bildirim_ac - Otomatik bildirimleri aç\n"
-                                        "/bagis - Geliştiriciye bağış yap")
+                                        "/bildirim_saatleri - Bildirim saatlerini gör veya değiştir\n"
+                                        "/bagis - Geliştiriciye bağış yap\n\n"
+                                        f"Sohbetlerde fiyat paylaşmak için mesaj kutusuna @{context.bot.username} "
+                                        "yazıp ürün adını girebilirsin.")
 
 
 async def send_prices(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -57,10 +69,37 @@ async def send_prices(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
                                        text="Şu anda fiyat bilgisi bulunmamaktadır.")
         return
 
-    message = Helper.generate_price_list_text(prices)
-    await context.bot.send_message(chat_id=update.effective_user.id,
-                                   text=message,
-                                   parse_mode=telegram.constants.ParseMode.HTML)
+    current = snapshot.publish(prices)
+    query = " ".join(context.args)
+
+    if not query:
+        pages = current.pages
+    elif normalize(query) == "ozet":
+        pages = current.compact_pages
+    else:
+        pages = current.find_group_pages(query)
+
+    if not pages:
+        await context.bot.send_message(chat_id=update.effective_user.id,
+                                       text=f"\"{query}\" ile eşleşen bir ürün bulunamadı.")
+        return
+
+    for page in pages:
+        await context.bot.send_message(chat_id=update.effective_user.id,
+                                       text=page,
+                                       parse_mode=telegram.constants.ParseMode.HTML)
+
+
+async def inline_prices(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    current = snapshot.get_current()
+
+    if current is None:
+        await update.inline_query.answer([], cache_time=5)
+        return
+
+    # There is no point in letting Telegram cache the results longer than the prices stay the same
+    cache_time = min(config.INLINE_CACHE_TIME, config.PRICE_UPDATE_INTERVAL)
+    await update.inline_query.answer(current.search(update.inline_query.query), cache_time=cache_time)
 
 
 async def send_price_graph(update: Update, context: ContextTypes.DEFAULT_TYPE, days: int):
@@ -110,6 +149,22 @@ async def last_30_days(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     await send_price_graph(update, context, days=30)
 
 
+async def send_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    statistics = await stats.get_latest()
+
+    if not statistics or not statistics.groups:
+        await context.bot.send_message(chat_id=update.effective_chat.id, text="Henüz istatistik mevcut değil!")
+        return
+
+    pages = Helper.generate_statistics_pages(statistics.groups)
+    pages = Helper.split_message(pages + ["<i>AOF: Miktar ağırlıklı ortalama fiyat</i>"], separator="\n\n")
+
+    for page in pages:
+        await context.bot.send_message(chat_id=update.effective_chat.id,
+                                       text=page,
+                                       parse_mode=telegram.constants.ParseMode.HTML)
+
+
 async def disable_notifier(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     telegram_user = update.effective_user
     user = await User.find_one({"user_id": str(telegram_user.id), "platform": "Telegram"})
@@ -117,6 +172,7 @@ async def disable_notifier(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     if not user.dnd:
         user.dnd = True
         await user.save()
+        scheduler.wheel.remove(user.user_id)
         await context.bot.send_message(chat_id=telegram_user.id,
                                        text="Bundan sonra otomatik fiyat bildirimi göndermeyeceğim. Tekrardan açmak "
                                             "için /bildirim_ac komutunu kullan!")
@@ -133,6 +189,7 @@ async def enable_notifier(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if user.dnd:
         user.dnd = False
         await user.save()
+        scheduler.wheel.add(user.user_id, user.notification_times)
         await context.bot.send_message(chat_id=telegram_user.id,
                                        text="Tamamdır, seni de abone listesine ekledim! Bundan sonra günlük mesaj "
                                             "göndereceğim fiyatlar hakkında!")
@@ -142,6 +199,52 @@ async def enable_notifier(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                                             "/bildirim_kapat komutunu kullanabilirsin.")
 
 
+async def set_notification_times(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    telegram_user = update.effective_user
+    user = await User.find_one({"user_id": str(telegram_user.id), "platform": "Telegram"})
+
+    if not context.args:
+        times = scheduler.format_times(user.notification_times or scheduler.wheel.default_times)
+        status = ("\nBildirimlerin şu anda kapalı, açmak için /bildirim_ac komutunu kullanabilirsin.\n"
+                  if user.dnd else "")
+        await context.bot.send_message(chat_id=telegram_user.id,
+                                       text=f"Bildirim saatlerin: {times}\n{status}\n"
+                                            "Değiştirmek için saatleri yazman yeterli, örneğin "
+                                            "/bildirim_saatleri 09:30 17:00\n"
+                                            "Varsayılan saatlere dönmek için /bildirim_saatleri varsayilan")
+        return
+
+    if context.args == ["varsayilan"]:
+        notification_times = None
+    else:
+        try:
+            notification_times = scheduler.parse_times(context.args)
+        except ValueError:
+            await context.bot.send_message(chat_id=telegram_user.id,
+                                           text="Saatleri 09:30 şeklinde, aralarında boşluk bırakarak yazmalısın.")
+            return
+
+        if len(notification_times) > MAX_NOTIFICATION_TIMES:
+            await context.bot.send_message(chat_id=telegram_user.id,
+                                           text=f"En fazla {MAX_NOTIFICATION_TIMES} bildirim saati seçebilirsin.")
+            return
+
+    user.notification_times = notification_times
+    await user.save()
+
+    times = scheduler.format_times(notification_times or scheduler.wheel.default_times)
+
+    if user.dnd:
+        await context.bot.send_message(chat_id=telegram_user.id,
+                                       text=f"Bildirim saatlerini {times} olarak kaydettim, fakat bildirimlerin "
+                                            "şu anda kapalı. Açmak için /bildirim_ac komutunu kullanabilirsin.")
+        return
+
+    scheduler.wheel.add(user.user_id, notification_times)
+    await context.bot.send_message(chat_id=telegram_user.id,
+                                   text=f"Tamamdır, fiyatları her gün {times} civarında göndereceğim.")
+
+
 async def admin_announcement(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     telegram_user = update.effective_user
 
@@ -158,6 +261,37 @@ async def admin_announcement(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return 1
 
 
+async def admin_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    telegram_user = update.effective_user
+
+    if telegram_user.id != config.ADMIN_CHAT_ID:
+        await context.bot.send_message(chat_id=telegram_user.id,
+                                       text="Bu komutu kullanmak için yetkin yok!")
+        return
+
+    if not context.args or (len(context.args) > 1 and not context.args[1].isdigit()):
+        await context.bot.send_message(chat_id=telegram_user.id,
+                                       text="Kullanım: /admin_profil <güncelleme sayısı | görev adı> [satır sayısı]\n\n"
+                                            "Örnek: /admin_profil 20 veya /admin_profil update_prices 40")
+        return
+
+    target = context.args[0]
+    top = int(context.args[1]) if len(context.args) > 1 else 25
+
+    if target.isdigit():
+        armed = profiler.arm_updates(context.bot, telegram_user.id, int(target), top)
+        message = f"Sonraki {target} güncelleme profillenecek."
+    else:
+        armed = profiler.arm_job(context.application, telegram_user.id, target, top)
+        message = f"{target} görevinin bir sonraki çalışması profillenecek."
+
+    if not armed:
+        message = "Profil başlatılamadı. Görev adı yanlış olabilir ya da başka bir profil devam ediyor."
+
+    await context.bot.send_message(chat_id=telegram_user.id,
+                                   text=message)
+
+
 async def done(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user_id = update.effective_user.id
     message = "Tamam şşşş, sohbet bitti!"
@@ -183,29 +317,16 @@ async def donate(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def admin_announcement_done(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     telegram_user = update.effective_user
     user_list = await User.find_all({"platform": "Telegram"})
-    active_user_counter = 0
-    inactive_user_ids = []
-
-    for target_user in user_list:
-        try:
-            await context.bot.copy_message(chat_id=target_user.user_id,
-                                           from_chat_id=telegram_user.id,
-                                           message_id=update.message.message_id)
-            active_user_counter += 1
-            logger.info(f"Message has been sent to {target_user.user_id}")
-        except (telegram.error.Forbidden, telegram.error.BadRequest):
-            logger.info(f"Message couldn't be delivered to {target_user.user_id}")
-            inactive_user_ids.append(target_user.user_id)
-            continue
-
-    if inactive_user_ids:
-        await User.update_many(query={"user_id": {"$in": inactive_user_ids}},
-                               update_data={"is_active": False})
-
-    message = (f"Duyuru başarıyla {active_user_counter} kullanıcıya iletildi. "
-               f"{len(inactive_user_ids)} kişi inaktif.")
+    broadcast = await task.create_broadcast(kind="copy",
+                                            payload={"from_chat_id": telegram_user.id,
+                                                     "message_id": update.message.message_id},
+                                            recipients=[user.user_id for user in user_list],
+                                            requester_chat_id=telegram_user.id)
+
+    # The broadcast is persisted, so it doesn't have to block the conversation. It will be resumed if it stops midway.
+    context.application.create_task(task.run_broadcast(context, broadcast))
     await context.bot.send_message(chat_id=telegram_user.id,
-                                   text=message)
+                                   text=f"Duyuru {len(user_list)} kullanıcıya gönderiliyor, bitince haber vereceğim.")
     return -1
 
 
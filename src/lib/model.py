@@ -1,5 +1,7 @@
 from datetime import datetime
 
+from pymongo import ReturnDocument
+
 
 class MongoModel:
     collection = None
@@ -93,6 +95,19 @@ class MongoModel:
         result = await cls.collection.update_one(query, {"$set": update_data})
         return result.modified_count
 
+    @classmethod
+    async def find_one_and_update(cls, query: dict, update_data: dict):
+        if cls.collection is None:
+            raise ValueError("Collection is not initialized. Call 'initialize_collection' first.")
+
+        document = await cls.collection.find_one_and_update(query, {"$set": update_data},
+                                                            return_document=ReturnDocument.AFTER)
+
+        if document:
+            return cls(**document)
+
+        return None
+
     @classmethod
     async def update_many(cls, query: dict, update_data: dict):
         if cls.collection is None:
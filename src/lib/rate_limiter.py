@@ -0,0 +1,38 @@
+import asyncio
+
+
+class RateLimiter:
+    """
+    A token bucket shared by the coroutines that call acquire(), at most `rate` calls are let through per second
+    and at most `burst` of them at once. With the default burst of 1 the calls are evenly spaced, so no window of
+    one second has more than `rate` of them.
+
+    Example:
+        limiter = RateLimiter(rate=25)
+        await limiter.acquire()
+    """
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # Waiters queue up on the lock, so they are let through in the order they arrived
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            self._refill(loop.time())
+
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill(loop.time())
+
+            self.tokens -= 1
+
+    def _refill(self, now: float) -> None:
+        if self.updated_at is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+
+        self.updated_at = now
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from .lib.model import MongoModel
 
 
@@ -11,10 +13,12 @@ class User(MongoModel):
             username: str = None,
             language: str = "en",
             is_active: bool = True,
+            notification_times: list[int] = None,
             **kwargs
     ):
         super().__init__(user_id=user_id, platform=platform, first_name=first_name, last_name=last_name,
-                         username=username, language=language, is_active=is_active, **kwargs)
+                         username=username, language=language, is_active=is_active,
+                         notification_times=notification_times, **kwargs)
 
 
 class PriceRecord(MongoModel):
@@ -29,3 +33,31 @@ class PriceRecord(MongoModel):
     ):
         super().__init__(product_name=product_name, average_price=average_price, max_price=max_price,
                          min_price=min_price, quantity=quantity, **kwargs)
+
+
+class PriceStatistics(MongoModel):
+    def __init__(
+            self,
+            groups: dict,
+            computed_at: datetime,
+            **kwargs
+    ):
+        super().__init__(groups=groups, computed_at=computed_at, **kwargs)
+
+
+class Broadcast(MongoModel):
+    def __init__(
+            self,
+            kind: str,
+            payload: dict,
+            recipients: list[str],
+            shards: list[dict],
+            status: str = "running",
+            requester_chat_id: int = None,
+            send_interval: float = 0,
+            expires_at: datetime = None,
+            **kwargs
+    ):
+        super().__init__(kind=kind, payload=payload, recipients=recipients, shards=shards, status=status,
+                         requester_chat_id=requester_chat_id, send_interval=send_interval, expires_at=expires_at,
+                         **kwargs)
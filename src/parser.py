@@ -0,0 +1,168 @@
+import codecs
+import json
+import logging
+import math
+import re
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_WHITESPACE_CHARACTERS = " \t\n\r"
+
+
+class BulletinError(ValueError):
+    pass
+
+
+@dataclass(slots=True)
+class Product:
+    name: str
+    quantity: int
+    max_price: float
+    min_price: float
+    avg_price: float
+
+
+@dataclass(slots=True)
+class ProductGroup:
+    name: str
+    max_price: float
+    min_price: float
+    avg_price: float
+    quantity: int = 0
+    products: list[Product] = field(default_factory=list)
+
+
+class BulletinParser:
+    """
+    Incrementally parses the bulletin of the market, a JSON array with one object per product.
+
+    Chunks can be fed as they arrive from the network, every complete product is converted as soon as it is read,
+    so the whole payload is never held as a list of dicts. Products that don't match the expected schema are
+    skipped and counted, they don't fail the rest of the bulletin.
+
+    Example:
+        parser = BulletinParser()
+        parser.feed(chunk)
+        groups = parser.close()
+    """
+
+    def __init__(self):
+        self.groups: dict[str, ProductGroup] = {}
+        self.rejected_rows = 0
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._started = False
+        self._finished = False
+        self._expects_item = True
+
+    def feed(self, chunk: bytes) -> None:
+        self._buffer += self._utf8.decode(chunk)
+        self._parse()
+
+    def close(self) -> dict[str, ProductGroup]:
+        """
+        Parses whatever is left in the buffer and returns the product groups.
+
+        Returns:
+            dict[str, ProductGroup]: Product groups by their names, in the order they appeared.
+
+        Raises:
+            BulletinError: If the payload isn't a complete JSON array.
+        """
+        self._buffer += self._utf8.decode(b"", final=True)
+        self._parse()
+
+        if not self._finished:
+            raise BulletinError(f"Bulletin is malformed or truncated near: {self._buffer[:100]!r}")
+
+        if self.rejected_rows:
+            logger.warning(f"{self.rejected_rows} malformed products have been skipped in the bulletin.")
+
+        return self.groups
+
+    def _parse(self) -> None:
+        buffer = self._buffer
+        position = _WHITESPACE.match(buffer).end()
+
+        if not self._started and position < len(buffer):
+            if buffer[position] != "[":
+                raise BulletinError(f"Bulletin must be a JSON array, not {buffer[:100]!r}")
+
+            self._started = True
+            position += 1
+
+        # scan_once is what JSONDecoder.raw_decode calls, skipping its wrapper saves a noticeable amount per product
+        scan_once = self._decoder.scan_once
+        length = len(buffer)
+
+        while self._started and not self._finished and position < length:
+            character = buffer[position]
+
+            if character == "," and not self._expects_item:
+                self._expects_item = True
+                position += 1
+            elif character == "]":
+                self._finished = True
+                position += 1
+            elif character in _WHITESPACE_CHARACTERS:
+                position = _WHITESPACE.match(buffer, position).end()
+            else:
+                try:
+                    row, position = scan_once(buffer, position)
+                except (StopIteration, json.JSONDecodeError):
+                    # Most likely the rest of the product hasn't arrived yet, close() tells if it never does
+                    break
+
+                self._expects_item = False
+                self._add_row(row)
+
+        self._buffer = buffer[position:]
+
+    def _add_row(self, row: object) -> None:
+        try:
+            group_name, product_name, quantity = row["GrupAdi"], row["UrunGrubu"], row["TopMiktar"]
+
+            if type(group_name) is not str or type(product_name) is not str or type(quantity) is not int:
+                raise TypeError("Names must be strings and the quantity must be an integer")
+
+            # Product prices come as strings with a decimal comma, e.g. "12,3500"
+            max_price = float(row["MaxFiyat"].replace(",", "."))
+            min_price = float(row["MinFiyat"].replace(",", "."))
+            avg_price = float(row["AvgFiyat"].replace(",", "."))
+
+            if not math.isfinite(max_price + min_price + avg_price):
+                raise ValueError("Prices must be finite")
+
+            group = self.groups.get(group_name)
+
+            # Group prices are repeated on every product of the group, they are only read for its first product
+            if group is None:
+                group = ProductGroup(name=group_name,
+                                     max_price=_to_group_price(row["GrupMaxFiyat"]),
+                                     min_price=_to_group_price(row["GrupMinFiyat"]),
+                                     avg_price=_to_group_price(row["GrupOrtFiyat"]))
+                self.groups[group_name] = group
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            self.rejected_rows += 1
+            logger.debug(f"Malformed product has been skipped in the bulletin: {e!r}")
+            return
+
+        group.products.append(Product(product_name, quantity, max_price, min_price, avg_price))
+        group.quantity += quantity
+
+
+def _to_group_price(value: object) -> float:
+    # Group prices come as integers in units of 1/10000 TL
+    if type(value) is not int:
+        raise TypeError(f"Group price must be an integer, not {value!r}")
+
+    return value / 10**4
+
+
+def parse_bulletin(payload: bytes) -> dict[str, ProductGroup]:
+    parser = BulletinParser()
+    parser.feed(payload)
+    return parser.close()
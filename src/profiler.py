@@ -0,0 +1,121 @@
+import cProfile
+import html
+import io
+import marshal
+import pstats
+from typing import Awaitable, Callable
+
+import telegram
+from telegram.ext import Application, ContextTypes, Job
+
+from .app import logger
+from .utils import Helper
+
+
+class Profiler:
+    """
+    Captures a cProfile profile of the next few updates or of the next run of a job, on the admin's request.
+
+    Nothing is hooked while the profiler isn't armed: OrderedApplication only checks remaining_updates, and job
+    callbacks are swapped with a profiling wrapper for a single run. cProfile sees the whole event loop, so anything
+    that runs concurrently with the profiled updates or job shows up in the profile as well.
+    """
+
+    def __init__(self):
+        self.remaining_updates = 0
+        self.active_updates = 0
+        self.profile: cProfile.Profile | None = None
+        self.patched_jobs: list[tuple[Job, Callable]] = []
+        self.bot: telegram.Bot | None = None
+        self.chat_id: int | None = None
+        self.top = 25
+
+    @property
+    def busy(self) -> bool:
+        return bool(self.remaining_updates or self.profile or self.patched_jobs)
+
+    def arm_updates(self, bot: telegram.Bot, chat_id: int, count: int, top: int) -> bool:
+        if self.busy or count < 1:
+            return False
+
+        self.bot, self.chat_id, self.top = bot, chat_id, top
+        self.remaining_updates = count
+        return True
+
+    def arm_job(self, application: Application, chat_id: int, job_name: str, top: int) -> bool:
+        jobs = application.job_queue.get_jobs_by_name(job_name)
+
+        if self.busy or not jobs:
+            return False
+
+        self.bot, self.chat_id, self.top = application.bot, chat_id, top
+
+        for job in jobs:
+            self.patched_jobs.append((job, job.callback))
+            job.callback = self._profile_job_callback(job.callback, job_name)
+
+        return True
+
+    async def profile_update(self, process_update: Callable[[object], Awaitable[None]], update: object) -> None:
+        self.remaining_updates -= 1
+        self.active_updates += 1
+        self._start()
+
+        try:
+            await process_update(update)
+        finally:
+            self.active_updates -= 1
+
+            if not self.remaining_updates and not self.active_updates:
+                await self._finish("updates")
+
+    def _profile_job_callback(self, callback: Callable, job_name: str) -> Callable:
+        async def profiled_callback(context: ContextTypes.DEFAULT_TYPE) -> None:
+            for job, original_callback in self.patched_jobs:
+                job.callback = original_callback
+
+            self.patched_jobs = []
+            self._start()
+
+            try:
+                await callback(context)
+            finally:
+                await self._finish(job_name)
+
+        return profiled_callback
+
+    def _start(self) -> None:
+        if self.profile is None:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    async def _finish(self, name: str) -> None:
+        profile, self.profile = self.profile, None
+        profile.disable()
+        profile.create_stats()
+
+        # pstats.Stats takes over the stats of the profile, so they are dumped for the profile file before that
+        profile_file = io.BytesIO(marshal.dumps(profile.stats))
+        summary = io.StringIO()
+        # Sorted by the time spent in the functions themselves, cumulative times are topped by the event loop and
+        # the dispatching wrappers which contain every update
+        pstats.Stats(profile, stream=summary).strip_dirs().sort_stats(pstats.SortKey.TIME).print_stats(self.top)
+        lines = [html.escape(line) for line in summary.getvalue().strip().splitlines()]
+        logger.info(f"Profile of {name} has been captured.")
+
+        try:
+            for page in Helper.split_message(lines, separator="\n",
+                                             limit=telegram.constants.MessageLimit.MAX_TEXT_LENGTH - 11):
+                await self.bot.send_message(chat_id=self.chat_id,
+                                            text=f"<pre>{page}</pre>",
+                                            parse_mode=telegram.constants.ParseMode.HTML)
+
+            await self.bot.send_document(chat_id=self.chat_id,
+                                         document=profile_file,
+                                         filename=f"{name}.prof",
+                                         caption="snakeviz veya pstats ile açabilirsin.")
+        except telegram.error.TelegramError:
+            logger.exception(f"Profile of {name} couldn't be delivered.")
+
+
+profiler = Profiler()
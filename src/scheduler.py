@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+import pytz
+from telegram.ext import Application
+
+from . import config
+from .app import User, logger
+
+TIMEZONE = pytz.timezone("Europe/Istanbul")
+MINUTES_IN_DAY = 24 * 60
+
+
+class NotificationWheel:
+    """
+    A time wheel of the day, every slot holds the users that want to be notified within its bucket of minutes.
+
+    Rather than notifying everyone at the same minute, a job ticks at the start of every bucket and the users of
+    that slot are notified gradually throughout the bucket, so the outbound rate stays flat as the users grow.
+    """
+
+    def __init__(self, bucket_minutes: int, default_times: list[int]):
+        self.bucket_minutes = bucket_minutes
+        self.default_times = default_times
+        self.slots: list[dict[str, int]] = [{} for _ in range(MINUTES_IN_DAY // bucket_minutes)]
+        self.user_slots: dict[str, list[int]] = {}
+
+    def add(self, user_id: str, notification_times: list[int] | None) -> None:
+        """
+        Schedules the user for the given minutes of the day, or for the default times if there aren't any.
+        """
+        self.remove(user_id)
+        self.user_slots[user_id] = []
+
+        for minute in notification_times or self.default_times:
+            slot = minute // self.bucket_minutes
+            self.slots[slot][user_id] = minute
+            self.user_slots[user_id].append(slot)
+
+    def remove(self, user_id: str) -> None:
+        for slot in self.user_slots.pop(user_id, []):
+            self.slots[slot].pop(user_id, None)
+
+    def slot_of(self, moment: datetime) -> int:
+        return (moment.hour * 60 + moment.minute) // self.bucket_minutes
+
+    def recipients(self, slot: int) -> list[str]:
+        """
+        Returns the users of the slot, ordered by the minute they have chosen.
+        """
+        return sorted(self.slots[slot], key=self.slots[slot].get)
+
+    def next_tick(self, moment: datetime) -> datetime:
+        minutes = (self.slot_of(moment) + 1) * self.bucket_minutes
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(minutes=minutes)
+
+
+def parse_times(texts: list[str]) -> list[int]:
+    """
+    Converts times like "09:30" into minutes of the day.
+
+    Raises:
+        ValueError: If any of the texts isn't a valid time.
+    """
+    minutes = []
+
+    for text in texts:
+        moment = datetime.strptime(text, "%H:%M")
+        minutes.append(moment.hour * 60 + moment.minute)
+
+    return sorted(set(minutes))
+
+
+def format_times(minutes: list[int]) -> str:
+    return ", ".join(f"{minute // 60:02d}:{minute % 60:02d}" for minute in minutes)
+
+
+wheel = NotificationWheel(bucket_minutes=config.NOTIFICATION_BUCKET_MINUTES,
+                          default_times=sorted(hour * 60 + minute for hour, minute in zip(config.PRICE_CHECK_HOURS,
+                                                                                          config.PRICE_CHECK_MINUTES)))
+
+
+async def load_wheel(application: Application) -> None:
+    users = await User.find_all({"dnd": False, "platform": "Telegram"})
+
+    for user in users:
+        wheel.add(user.user_id, user.notification_times)
+
+    logger.info(f"{len(users)} users have been scheduled for notifications.")
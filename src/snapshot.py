@@ -0,0 +1,170 @@
+import re
+from datetime import datetime
+from functools import cached_property
+
+import telegram
+from telegram import InlineQueryResultArticle, InputTextMessageContent
+
+from .parser import ProductGroup
+from .utils import Helper
+
+# Telegram doesn't accept more than 50 results for an inline query
+MAX_INLINE_RESULTS = 50
+MAX_PREFIX_LENGTH = 20
+
+# Users mostly type without Turkish characters, so "bugday" should find "BUĞDAY" as well
+_TURKISH_UPPER = str.maketrans({"I": "ı", "İ": "i"})
+_TURKISH_ASCII = str.maketrans("çğıöşüâîû", "cgiosuaiu")
+
+
+def normalize(text: str) -> str:
+    text = text.translate(_TURKISH_UPPER).lower().translate(_TURKISH_ASCII)
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class PriceSnapshot:
+    """
+    The latest price information that is known, along with everything derived from it.
+
+    Inline queries arrive on every keystroke, so the search index and the inline results are built once here
+    and inline queries never touch the market servers or the database. The same goes for the price list
+    messages, they are rendered once per snapshot and shared by every user and every broadcast.
+    """
+
+    def __init__(self, groups: dict[str, ProductGroup], version: int):
+        self.groups = groups
+        self.version = version
+        self.created_at = datetime.now()
+        self.names: list[str] = []
+        self.group_names: list[str] = []
+        self.results: list[InlineQueryResultArticle] = []
+        self.prefixes: dict[str, set[int]] = {}
+        self.trigrams: dict[str, set[int]] = {}
+        self.group_texts = {name: Helper.generate_group_price_text(name, group) for name, group in groups.items()}
+        self.group_count = len(groups)
+
+        # Groups are indexed first, since result ids are also used to rank groups before products
+        for name, group in groups.items():
+            self._add(group_name=name,
+                      title=name,
+                      keywords=name,
+                      description=f"Ortalama {Helper.format_price(group.avg_price)} TL",
+                      text=self.group_texts[name])
+
+        for group_name, group in groups.items():
+            for product in group.products:
+                self._add(group_name=group_name,
+                          title=product.name,
+                          keywords=f"{product.name} {group_name}",
+                          description=f"{group_name}, ortalama {Helper.format_price(product.avg_price)} TL",
+                          text=Helper.generate_product_price_text(group_name, product))
+
+    def _add(self, group_name: str, title: str, keywords: str, description: str, text: str) -> None:
+        index = len(self.results)
+        name = normalize(keywords)
+        self.names.append(name)
+        self.group_names.append(group_name)
+        self.results.append(InlineQueryResultArticle(
+            id=str(index),
+            title=title,
+            description=description,
+            input_message_content=InputTextMessageContent(text, parse_mode=telegram.constants.ParseMode.HTML)
+        ))
+
+        for word in name.split():
+            for length in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1):
+                self.prefixes.setdefault(word[:length], set()).add(index)
+
+        for trigram in trigrams(name):
+            self.trigrams.setdefault(trigram, set()).add(index)
+
+    @cached_property
+    def pages(self) -> list[str]:
+        return Helper.split_message(list(self.group_texts.values()), separator="\n\n\n")
+
+    @cached_property
+    def compact_pages(self) -> list[str]:
+        return Helper.generate_compact_price_list_pages(self.groups)
+
+    def search(self, query: str) -> list[InlineQueryResultArticle]:
+        """
+        Finds the price cards whose names match every word of the query.
+
+        A word matches when it is the prefix of a word in the name, otherwise the trigram index is used to find
+        names that contain it anywhere.
+
+        Args:
+            query (str): Text that the user typed after the bot's username.
+
+        Returns:
+            list[InlineQueryResultArticle]: Matching price cards, product groups first.
+        """
+        if not query.strip():
+            return self.results[:min(self.group_count, MAX_INLINE_RESULTS)]
+
+        return [self.results[index] for index in self._match(query)[:MAX_INLINE_RESULTS]]
+
+    def find_group_pages(self, query: str) -> list[str]:
+        """
+        Finds the product groups whose names match every word of the query, or that have a matching product.
+
+        Args:
+            query (str): Name of a product group or a product.
+
+        Returns:
+            list[str]: Price list messages of the matching groups only, empty if nothing matches.
+        """
+        matched_names = []
+
+        for index in self._match(query):
+            if self.group_names[index] not in matched_names:
+                matched_names.append(self.group_names[index])
+
+        return Helper.split_message([self.group_texts[name] for name in matched_names], separator="\n\n\n")
+
+    def _match(self, query: str) -> list[int]:
+        terms = normalize(query).split()
+        matches = None
+
+        for term in terms:
+            candidates = self.prefixes.get(term) if len(term) <= MAX_PREFIX_LENGTH else None
+
+            if not candidates and len(term) >= 3:
+                candidates = set.intersection(*[self.trigrams.get(trigram, set()) for trigram in trigrams(term)])
+                candidates = {index for index in candidates if term in self.names[index]}
+
+            matches = (candidates or set()) if matches is None else matches & (candidates or set())
+
+            if not matches:
+                return []
+
+        return sorted(matches) if matches else []
+
+
+_current: PriceSnapshot | None = None
+
+
+def get_current() -> PriceSnapshot | None:
+    return _current
+
+
+def publish(groups: dict[str, ProductGroup]) -> PriceSnapshot:
+    """
+    Makes the given prices the current snapshot. Nothing is rebuilt if the prices didn't change.
+
+    Args:
+        groups (dict[str, ProductGroup]): Product groups by their names, as returned by fetch_prices.
+
+    Returns:
+        PriceSnapshot: The current snapshot.
+    """
+    global _current
+
+    if _current is None or _current.groups != groups:
+        _current = PriceSnapshot(groups, version=_current.version + 1 if _current else 1)
+
+    return _current
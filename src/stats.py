@@ -0,0 +1,167 @@
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+
+from .app import PriceRecord, PriceStatistics, logger
+from .parser import ProductGroup
+
+WINDOWS = (7, 30, 90)
+HISTORY_DAYS = max(WINDOWS)
+
+
+class PriceSeries:
+    """
+    Daily group prices laid out on a calendar grid that ends today, one row per product group.
+
+    Days without any trading (weekends, holidays) are kept as NaN, so a window of N days is always the last N
+    columns and every statistic can be computed for all groups at once.
+    """
+
+    def __init__(self, end: date):
+        self.end = end
+        self.rows: dict[str, int] = {}
+        self.avg_prices = np.full((0, HISTORY_DAYS), np.nan)
+        self.min_prices = np.full((0, HISTORY_DAYS), np.nan)
+        self.max_prices = np.full((0, HISTORY_DAYS), np.nan)
+        self.quantities = np.full((0, HISTORY_DAYS), np.nan)
+
+    @classmethod
+    async def load(cls, end: date) -> "PriceSeries":
+        series = cls(end)
+        start = datetime.combine(end - timedelta(days=HISTORY_DAYS - 1), time())
+
+        for record in await PriceRecord.find_all({"created_at": {"$gte": start}}):
+            series.set(record.product_name, record.created_at.date(), record.average_price, record.min_price,
+                       record.max_price, record.quantity)
+
+        return series
+
+    def set(self, name: str, day: date, avg_price: float, min_price: float, max_price: float, quantity: int) -> None:
+        column = HISTORY_DAYS - 1 - (self.end - day).days
+
+        if not 0 <= column < HISTORY_DAYS:
+            return
+
+        if name not in self.rows:
+            self.rows[name] = len(self.rows)
+            empty_row = np.full((1, HISTORY_DAYS), np.nan)
+            self.avg_prices = np.vstack((self.avg_prices, empty_row))
+            self.min_prices = np.vstack((self.min_prices, empty_row))
+            self.max_prices = np.vstack((self.max_prices, empty_row))
+            self.quantities = np.vstack((self.quantities, empty_row))
+
+        row = self.rows[name]
+        self.avg_prices[row, column] = avg_price
+        self.min_prices[row, column] = min_price
+        self.max_prices[row, column] = max_price
+        self.quantities[row, column] = quantity
+
+    def advance(self, end: date) -> None:
+        """
+        Moves the end of the grid to the given day, dropping the days that fall out of the history.
+        """
+        shift = min((end - self.end).days, HISTORY_DAYS)
+
+        if shift <= 0:
+            return
+
+        for array in (self.avg_prices, self.min_prices, self.max_prices, self.quantities):
+            array[:, :-shift] = array[:, shift:].copy()
+            array[:, -shift:] = np.nan
+
+        self.end = end
+
+    def update(self, groups: dict[str, ProductGroup], day: date) -> None:
+        self.advance(day)
+
+        for name, group in groups.items():
+            self.set(name, day, group.avg_price, group.min_price, group.max_price, group.quantity)
+
+    def compute(self) -> dict:
+        """
+        Computes the change, minimum, maximum, volatility and volume weighted average price of every group
+        for each window.
+
+        Returns:
+            dict: Statistics by group name and then by window length, NaN values are replaced with None.
+        """
+        statistics = {name: {} for name in self.rows}
+        row_indices = np.arange(len(self.rows))
+
+        for window in WINDOWS:
+            prices = self.avg_prices[:, -window:]
+            quantities = self.quantities[:, -window:]
+            traded = ~np.isnan(prices)
+
+            first = prices[row_indices, traded.argmax(axis=1)]
+            last = prices[row_indices, window - 1 - traded[:, ::-1].argmax(axis=1)]
+
+            # Fill the days without trading with the previous price, so returns are taken between trading days
+            last_traded = np.maximum.accumulate(np.where(traded, np.arange(window), 0), axis=1)
+            filled = prices[row_indices[:, None], last_traded]
+            has_return = traded[:, 1:] & (np.cumsum(traded, axis=1)[:, :-1] > 0)
+            return_count = has_return.sum(axis=1)
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                change = (last - first) / first * 100
+                returns = np.where(has_return, np.diff(np.log(filled), axis=1), 0)
+                mean_return = returns.sum(axis=1) / return_count
+                deviations = np.where(has_return, returns - mean_return[:, None], 0)
+                volatility = np.sqrt((deviations ** 2).sum(axis=1) / (return_count - 1)) * 100
+                vwap = np.nansum(prices * quantities, axis=1) / np.nansum(quantities, axis=1)
+
+            change[traded.sum(axis=1) < 2] = np.nan
+            volatility[return_count < 2] = np.nan
+            lowest = np.fmin.reduce(self.min_prices[:, -window:], axis=1)
+            highest = np.fmax.reduce(self.max_prices[:, -window:], axis=1)
+
+            for name, row in self.rows.items():
+                statistics[name][str(window)] = {
+                    "change": _to_value(change[row]),
+                    "min_price": _to_value(lowest[row]),
+                    "max_price": _to_value(highest[row]),
+                    "volatility": _to_value(volatility[row]),
+                    "vwap": _to_value(vwap[row])
+                }
+
+        return statistics
+
+
+def _to_value(value: np.floating) -> float | None:
+    return None if not np.isfinite(value) else float(value)
+
+
+_series: PriceSeries | None = None
+_latest: PriceStatistics | None = None
+
+
+async def refresh(groups: dict[str, ProductGroup]) -> None:
+    """
+    Updates the series with the latest prices and stores the recomputed statistics.
+
+    The series is read from the database only once, after that only today's column is replaced.
+
+    Args:
+        groups (dict[str, ProductGroup]): Product groups by their names, as returned by fetch_prices.
+    """
+    global _series, _latest
+    today = date.today()
+
+    if _series is None:
+        _series = await PriceSeries.load(today)
+    else:
+        _series.update(groups, today)
+
+    statistics = PriceStatistics(groups=_series.compute(), computed_at=datetime.now())
+    await statistics.save(query={})
+    _latest = statistics
+    logger.info("Price statistics have been updated.")
+
+
+async def get_latest() -> PriceStatistics | None:
+    global _latest
+
+    if _latest is None:
+        _latest = await PriceStatistics.find_one({})
+
+    return _latest
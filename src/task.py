@@ -1,15 +1,34 @@
 import asyncio
+import os
+import socket
 from datetime import datetime, timedelta
 
 import telegram
 from telegram.ext import ContextTypes
 
-from . import config
-from .app import PriceRecord, User, logger
+from . import config, scheduler, snapshot, stats
+from .app import Broadcast, PriceRecord, User, logger
+from .lib.rate_limiter import RateLimiter
 from .utils import Helper
 
+# Identifies this process as the owner of the broadcast shards it claims
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Shards that are being sent by this process, as (broadcast id, shard index)
+_running_shards: set[tuple] = set()
+
+# Telegram's limit applies to the bot as a whole, so every message of every broadcast goes through the same bucket
+_rate_limiter = RateLimiter(rate=config.MAX_MESSAGES_PER_SECOND)
+
 
 async def check_and_notify_prices(context: ContextTypes.DEFAULT_TYPE) -> None:
+    wheel = scheduler.wheel
+    now = datetime.now(scheduler.TIMEZONE)
+    recipients = wheel.recipients(wheel.slot_of(now))
+
+    if not recipients:
+        return
+
     try:
         prices = await Helper.fetch_prices()
     except asyncio.exceptions.TimeoutError:
@@ -24,24 +43,21 @@ async def check_and_notify_prices(context: ContextTypes.DEFAULT_TYPE) -> None:
                                        text="Şu anda fiyat bilgisi bulunmamaktadır.")
         return
 
-    user_list = await User.find_all({"dnd": False, "platform": "Telegram"})
-    inactive_user_ids = []
-    message = Helper.generate_price_list_text(prices)
+    current = snapshot.publish(prices)
 
-    for target_user in user_list:
-        try:
-            await context.bot.send_message(chat_id=target_user.user_id,
-                                           text=message,
-                                           parse_mode=telegram.constants.ParseMode.HTML)
-            logger.info(f"Message has been sent to {target_user.user_id}")
-        except (telegram.error.Forbidden, telegram.error.BadRequest):
-            logger.info(f"Message couldn't be delivered to {target_user.user_id}")
-            inactive_user_ids.append(target_user.user_id)
-            continue
+    # Every recipient gets one message per page, they are spread over the bucket. Overlapping broadcasts are kept
+    # under the rate limit together by the shared rate limiter.
+    send_interval = max(wheel.bucket_minutes * 60 / len(recipients),
+                        len(current.pages) / config.MAX_MESSAGES_PER_SECOND)
+    broadcast = await create_broadcast(kind="text",
+                                       payload={"texts": current.pages,
+                                                "parse_mode": telegram.constants.ParseMode.HTML},
+                                       recipients=recipients,
+                                       send_interval=send_interval,
+                                       expires_at=datetime.now() + (wheel.next_tick(now) - now))
 
-    if inactive_user_ids:
-        await User.update_many(query={"user_id": {"$in": inactive_user_ids}},
-                               update_data={"is_active": False})
+    # The broadcast takes about the whole bucket, the job shouldn't be running when the next bucket starts
+    context.application.create_task(run_broadcast(context, broadcast))
 
 
 async def update_prices(context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -59,6 +75,7 @@ async def update_prices(context: ContextTypes.DEFAULT_TYPE) -> None:
                                        text="Şu anda fiyat bilgisi bulunmamaktadır.")
         return
 
+    snapshot.publish(groups)
     group_names = list(groups.keys())
     today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     today_end = today_start + timedelta(days=1)
@@ -71,10 +88,10 @@ async def update_prices(context: ContextTypes.DEFAULT_TYPE) -> None:
 
     for name, group in groups.items():
         product = PriceRecord(product_name=name,
-                              average_price=group["group_avg_price"],
-                              max_price=group["group_max_price"],
-                              min_price=group["group_min_price"],
-                              quantity=group["group_quantity"])
+                              average_price=group.avg_price,
+                              max_price=group.max_price,
+                              min_price=group.min_price,
+                              quantity=group.quantity)
         price_records_to_save.append(product)
 
     await PriceRecord.insert_many(price_records_to_save)
@@ -83,3 +100,260 @@ async def update_prices(context: ContextTypes.DEFAULT_TYPE) -> None:
     if object_ids_to_delete:
         await PriceRecord.delete_many({"_id": {"$in": object_ids_to_delete}})
         logger.info("Old price records have been deleted from the database.")
+
+    await stats.refresh(groups)
+
+
+async def create_broadcast(kind: str, payload: dict, recipients: list[str], requester_chat_id: int = None,
+                           send_interval: float = 0, expires_at: datetime = None) -> Broadcast:
+    """
+    Persists a new broadcast job before anything is sent, so it can be resumed if the process dies midway.
+
+    Recipients are split into shards by striding over the list, each shard keeps its own cursor and counters.
+    A shard is sent by the process that claims it, so several processes can share a broadcast without sending
+    the same messages twice.
+    A text broadcast may have several pages, the cursor moves to the next recipient once all of them are sent.
+    When send_interval is given, deliveries of all shards together are paced to one per send_interval seconds.
+    A broadcast isn't resumed after expires_at, if it is given.
+    """
+    shard_count = max(1, min(config.BROADCAST_SHARDS, len(recipients)))
+    shards = [{"cursor": 0, "page": 0, "delivered": 0, "failed": 0, "done": False, "owner": None, "lease_until": None}
+              for _ in range(shard_count)]
+    broadcast = Broadcast(kind=kind,
+                          payload=payload,
+                          recipients=recipients,
+                          shards=shards,
+                          requester_chat_id=requester_chat_id,
+                          send_interval=send_interval,
+                          expires_at=expires_at)
+    await broadcast.save()
+    logger.info(f"Broadcast {broadcast._id} has been created for {len(recipients)} users in {shard_count} shards.")
+    return broadcast
+
+
+async def run_broadcast(context: ContextTypes.DEFAULT_TYPE, broadcast: Broadcast) -> None:
+    indices = [index for index, shard in enumerate(broadcast.shards)
+               if not shard["done"] and (broadcast._id, index) not in _running_shards]
+    results = await asyncio.gather(*[_run_broadcast_shard(context.bot, broadcast, index) for index in indices],
+                                   return_exceptions=True)
+
+    for index, result in zip(indices, results):
+        if isinstance(result, Exception):
+            logger.error(f"Shard {index} of broadcast {broadcast._id} has stopped, it will be resumed: {result!r}")
+
+    broadcast = await Broadcast.find_one({"_id": broadcast._id})
+
+    if not all(shard["done"] for shard in broadcast.shards):
+        return
+
+    # Shards may be finished by separate calls, e.g. a resumed one, only the call which flips the status reports.
+    finished = await Broadcast.update(query={"_id": broadcast._id, "status": "running"},
+                                      update_data={"status": "done", "finished_at": datetime.now()})
+
+    if not finished:
+        return
+
+    logger.info(f"Broadcast {broadcast._id} has been completed.")
+
+    if broadcast.requester_chat_id:
+        delivered = sum(shard["delivered"] for shard in broadcast.shards)
+        failed = sum(shard["failed"] for shard in broadcast.shards)
+        await context.bot.send_message(chat_id=broadcast.requester_chat_id,
+                                       text=f"Duyuru başarıyla {delivered} kullanıcıya iletildi. "
+                                            f"{failed} kişiye iletilemedi.")
+
+
+async def resume_broadcasts(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Resumes the shards of unfinished broadcasts that nobody is sending, either because their process was restarted
+    or because they have stopped on an unexpected error. It runs periodically, so no broadcast stays unfinished.
+
+    Every broadcast is resumed as a separate task. Price notifications whose bucket has passed are expired instead,
+    since the prices they carry are stale by then, announcements are always resumed.
+    """
+    broadcasts = await Broadcast.find_all({"status": "running"}, sort=[("created_at", 1)])
+
+    for broadcast in broadcasts:
+        if all(shard["done"] or (broadcast._id, index) in _running_shards or _is_leased(shard)
+               for index, shard in enumerate(broadcast.shards)):
+            continue
+
+        if broadcast.expires_at and broadcast.expires_at < datetime.now():
+            # Shards that are still being sent aren't interrupted, the broadcast is expired once they stop
+            if any((broadcast._id, index) in _running_shards or _is_leased(shard)
+                   for index, shard in enumerate(broadcast.shards)):
+                continue
+
+            await Broadcast.update(query={"_id": broadcast._id, "status": "running"},
+                                   update_data={"status": "expired", "finished_at": datetime.now()})
+            logger.info(f"Broadcast {broadcast._id} has expired before it could be completed.")
+            continue
+
+        logger.info(f"Resuming the unfinished broadcast {broadcast._id}.")
+        context.application.create_task(run_broadcast(context, broadcast))
+
+
+async def _run_broadcast_shard(bot: telegram.Bot, broadcast: Broadcast, index: int) -> None:
+    key = (broadcast._id, index)
+
+    if key in _running_shards:
+        return
+
+    _running_shards.add(key)
+
+    try:
+        claimed = await _claim_shard(broadcast, index)
+
+        if claimed is None:
+            logger.info(f"Shard {index} of broadcast {broadcast._id} is being sent by another process.")
+            return
+
+        lease_lost = asyncio.Event()
+        heartbeat = asyncio.create_task(_keep_lease(broadcast, index, lease_lost))
+
+        try:
+            await _send_shard(bot, claimed, index, lease_lost)
+        finally:
+            heartbeat.cancel()
+    finally:
+        _running_shards.discard(key)
+
+
+async def _claim_shard(broadcast: Broadcast, index: int) -> Broadcast | None:
+    """
+    Takes the ownership of the shard if nobody owns it or its owner's lease has expired.
+
+    Returns:
+        Broadcast | None: The broadcast with the latest progress of the shard, None if it couldn't be claimed.
+    """
+    now = datetime.now()
+    return await Broadcast.find_one_and_update(
+        query={"_id": broadcast._id,
+               "status": "running",
+               f"shards.{index}.done": False,
+               "$or": [{f"shards.{index}.owner": None}, {f"shards.{index}.lease_until": {"$lt": now}}]},
+        update_data={f"shards.{index}.owner": WORKER_ID,
+                     f"shards.{index}.lease_until": now + timedelta(seconds=config.BROADCAST_LEASE_SECONDS)}
+    )
+
+
+async def _keep_lease(broadcast: Broadcast, index: int, lease_lost: asyncio.Event) -> None:
+    # Renewed independently of the deliveries, since pacing and flood waits may take longer than the lease
+    while True:
+        await asyncio.sleep(config.BROADCAST_LEASE_SECONDS / 3)
+
+        try:
+            renewed = await Broadcast.update(
+                query={"_id": broadcast._id, f"shards.{index}.owner": WORKER_ID},
+                update_data={f"shards.{index}.lease_until":
+                             datetime.now() + timedelta(seconds=config.BROADCAST_LEASE_SECONDS)}
+            )
+        except Exception as e:
+            logger.warning(f"Lease of shard {index} of broadcast {broadcast._id} couldn't be renewed: {e!r}")
+            continue
+
+        if not renewed:
+            lease_lost.set()
+            return
+
+
+def _is_leased(shard: dict) -> bool:
+    return shard.get("owner") is not None and shard["lease_until"] > datetime.now()
+
+
+async def _send_shard(bot: telegram.Bot, broadcast: Broadcast, index: int, lease_lost: asyncio.Event) -> None:
+    shard = broadcast.shards[index]
+    recipients = broadcast.recipients[index::len(broadcast.shards)]
+    cursor, delivered, failed = shard["cursor"], shard["delivered"], shard["failed"]
+    page = shard.get("page", 0)
+    page_count = len(broadcast.payload["texts"]) if broadcast.kind == "text" else 1
+    attempts = 0
+    inactive_user_ids = []
+    loop = asyncio.get_running_loop()
+    send_interval = broadcast.send_interval * len(broadcast.shards)
+    # Shards start staggered, so together they send at an even pace rather than in bursts
+    next_send_at = loop.time() + index * broadcast.send_interval
+
+    try:
+        while cursor < len(recipients):
+            if lease_lost.is_set():
+                logger.warning(f"Shard {index} of broadcast {broadcast._id} has been taken over by another process.")
+                return
+
+            user_id = recipients[cursor]
+
+            if send_interval and page == 0 and attempts == 0:
+                await asyncio.sleep(max(0.0, next_send_at - loop.time()))
+                next_send_at = max(next_send_at + send_interval, loop.time())
+
+            try:
+                await _deliver_broadcast(bot, broadcast, user_id, page)
+            except telegram.error.RetryAfter as e:
+                # Only the page that hit the limit is sent again, the recipient already has the previous ones
+                logger.warning(f"Flood limit exceeded, waiting {e.retry_after} seconds.")
+                await asyncio.sleep(e.retry_after)
+                continue
+            except (telegram.error.Forbidden, telegram.error.BadRequest):
+                failed += 1
+                logger.info(f"Message couldn't be delivered to {user_id}")
+                inactive_user_ids.append(user_id)
+            except telegram.error.NetworkError as e:
+                # Timeouts and connection errors are mostly gone in seconds, the user isn't flagged as inactive
+                if attempts < config.BROADCAST_MAX_RETRIES:
+                    attempts += 1
+                    logger.warning(f"Message couldn't be sent to {user_id}, retrying in {2 ** attempts} seconds: {e}")
+                    await asyncio.sleep(2 ** attempts)
+                    continue
+
+                failed += 1
+                logger.error(f"Message couldn't be delivered to {user_id} after {attempts} retries: {e}")
+            else:
+                page += 1
+                attempts = 0
+
+                if page < page_count:
+                    continue
+
+                delivered += 1
+                logger.info(f"Message has been sent to {user_id}")
+
+            cursor += 1
+            page = 0
+            attempts = 0
+
+            if cursor % config.BROADCAST_BATCH_SIZE == 0 and cursor < len(recipients):
+                lease_until = datetime.now() + timedelta(seconds=config.BROADCAST_LEASE_SECONDS)
+                await _save_shard(broadcast, index, {"cursor": cursor, "page": page, "delivered": delivered,
+                                                     "failed": failed, "done": False, "owner": WORKER_ID,
+                                                     "lease_until": lease_until}, inactive_user_ids)
+                inactive_user_ids = []
+    finally:
+        # The progress is saved however the shard stops and the shard is released, so it can be resumed right away
+        await _save_shard(broadcast, index, {"cursor": cursor, "page": page, "delivered": delivered, "failed": failed,
+                                             "done": cursor == len(recipients), "owner": None, "lease_until": None},
+                          inactive_user_ids)
+
+
+async def _save_shard(broadcast: Broadcast, index: int, shard: dict, inactive_user_ids: list[str]) -> None:
+    # Inactive users are flagged before the cursor moves, replaying a batch after a crash is harmless.
+    if inactive_user_ids:
+        await User.update_many(query={"user_id": {"$in": inactive_user_ids}},
+                               update_data={"is_active": False})
+
+    # Nothing is saved once the shard has been taken over, the new owner's progress is ahead of ours
+    await Broadcast.update(query={"_id": broadcast._id, f"shards.{index}.owner": WORKER_ID},
+                           update_data={f"shards.{index}": shard})
+
+
+async def _deliver_broadcast(bot: telegram.Bot, broadcast: Broadcast, user_id: str, page: int) -> None:
+    payload = broadcast.payload
+    await _rate_limiter.acquire()
+
+    if broadcast.kind == "copy":
+        await bot.copy_message(chat_id=user_id,
+                               from_chat_id=payload["from_chat_id"],
+                               message_id=payload["message_id"])
+    else:
+        await bot.send_message(chat_id=user_id,
+                               text=payload["texts"][page],
+                               parse_mode=payload.get("parse_mode"))
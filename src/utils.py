@@ -1,91 +1,199 @@
+import html
+import logging
 from datetime import datetime
 from io import BytesIO
 
 import aiohttp
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
+import telegram
 from matplotlib.lines import Line2D
 
+from .parser import BulletinError, BulletinParser, Product, ProductGroup
+
+logger = logging.getLogger(__name__)
+
 
 class Helper:
 
     @staticmethod
-    async def fetch_prices() -> dict | None:
+    async def fetch_prices() -> dict[str, ProductGroup] | None:
         """
         Fetches the latest product prices from the external API.
 
+        The response is parsed while it is being downloaded, malformed products are skipped.
+
         Returns:
-            dict | None: A dictionary containing product information by product groups,
-                or None if the request fails.
+            dict[str, ProductGroup] | None: Product groups with their products by group names,
+                or None if the request fails or the bulletin can't be parsed.
+
+        Raises:
+            asyncio.exceptions.TimeoutError: If the market servers don't respond in time.
         """
         today_date = datetime.today().strftime('%Y-%m-%d')
-        groups = dict()
-
-        async with aiohttp.ClientSession(read_timeout=3) as session:
-            async with session.get(f"https://www.ktb.org.tr/api/v1/Alpha.WebPanel/OnlineKullaniciBulten/GetAnlikBulten/{today_date}", ssl=False) as resp:
-                product_list: list[dict] = await resp.json()
-
-                for product in product_list:
-                    product_name = product["UrunGrubu"]
-                    product_quantity = product["TopMiktar"]
-                    product_max_price = float(product["MaxFiyat"].replace(',', '.'))
-                    product_min_price = float(product["MinFiyat"].replace(',', '.'))
-                    product_avg_price = float(product["AvgFiyat"].replace(',', '.'))
-
-                    group_name = product["GrupAdi"]
-                    group_max_price = product["GrupMaxFiyat"] / 10**4
-                    group_min_price = product["GrupMinFiyat"] / 10**4
-                    group_avg_price = product["GrupOrtFiyat"] / 10**4
-
-                    if group_name not in groups:
-                        groups[group_name] = {
-                            "products": [],
-                            "group_max_price": group_max_price,
-                            "group_min_price": group_min_price,
-                            "group_avg_price": group_avg_price,
-                            "group_quantity": 0
-                        }
-
-                    groups[group_name]["products"].append({
-                        "name": product_name,
-                        "quantity": product_quantity,
-                        "max_price": product_max_price,
-                        "min_price": product_min_price,
-                        "avg_price": product_avg_price
-                    })
-                    groups[group_name]["group_quantity"] += product_quantity
-
-                return groups
+        parser = BulletinParser()
+
+        try:
+            async with aiohttp.ClientSession(read_timeout=3) as session:
+                async with session.get(f"https://www.ktb.org.tr/api/v1/Alpha.WebPanel/OnlineKullaniciBulten/GetAnlikBulten/{today_date}", ssl=False) as resp:
+                    async for chunk in resp.content.iter_chunked(64 * 1024):
+                        parser.feed(chunk)
+
+                    return parser.close()
+        except (aiohttp.ClientError, BulletinError) as e:
+            logger.error(f"Prices couldn't be fetched from the market servers: {e!r}")
+            return None
+
+    @staticmethod
+    def generate_compact_price_list_pages(groups: dict[str, ProductGroup]) -> list[str]:
+        """
+        Generates a one line per group summary of the product price list, split into messages that
+        fit into Telegram's message length limit.
+
+        Args:
+            groups (dict[str, ProductGroup]): Product groups by their names, as returned by fetch_prices.
+
+        Returns:
+            list[str]: Formatted strings with the average price and the price range of each product group.
+        """
+        lines = [f"\U0001F4CC <b>{html.escape(name)}:</b>  {Helper.format_price(group.avg_price)} TL  "
+                 f"({Helper.format_price(group.min_price)} - {Helper.format_price(group.max_price)})"
+                 for name, group in groups.items()]
+        return Helper.split_message(lines, separator="\n")
+
+    @staticmethod
+    def generate_group_price_text(name: str, group: ProductGroup) -> str:
+        """
+        Generates the price card of a single product group, as it appears in the price list.
+
+        Args:
+            name (str): Name of the product group.
+            group (ProductGroup): Product group information, as returned by fetch_prices.
+
+        Returns:
+            str: A formatted string of the minimum, maximum and average prices and the quantity of the group.
+        """
+        return Helper._generate_price_card_text(f"<u><b>{html.escape(name)}</b></u>",
+                                                group.min_price,
+                                                group.max_price,
+                                                group.avg_price,
+                                                group.quantity)
+
+    @staticmethod
+    def generate_product_price_text(group_name: str, product: Product) -> str:
+        """
+        Generates the price card of a single product within a product group.
+
+        Args:
+            group_name (str): Name of the product group that the product belongs to.
+            product (Product): Product information, as found in the products list of a group.
+
+        Returns:
+            str: A formatted string of the minimum, maximum and average prices and the quantity of the product.
+        """
+        return Helper._generate_price_card_text(f"<u><b>{html.escape(product.name)}</b></u> "
+                                                f"({html.escape(group_name)})",
+                                                product.min_price,
+                                                product.max_price,
+                                                product.avg_price,
+                                                product.quantity)
 
     @staticmethod
-    def generate_price_list_text(groups: dict) -> str:
+    def generate_statistics_pages(groups: dict) -> list[str]:
         """
-        Generates a formatted text representation of the product price list.
+        Generates a formatted text representation of the precomputed price statistics, split into messages
+        that fit into Telegram's message length limit.
 
         Args:
-            groups (dict): A dictionary containing product information by product groups.
+            groups (dict): Statistics by group name and then by window length, as computed by PriceSeries.
 
         Returns:
-            str: A formatted string representing the price list, including minimum,
-                maximum, and average prices, as well as the quantity for each product.
+            list[str]: Formatted strings including the change, price range, volatility and volume weighted
+                average price of each group for every window.
+        """
+        blocks = []
+
+        for name, windows in groups.items():
+            lines = [f"\U0001F4CA  <u><b>{html.escape(name)}</b></u>"]
+
+            for window, values in windows.items():
+                change = "-" if values["change"] is None else f"%{values["change"]:+.2f}".replace(".", ",")
+                volatility = "-" if values["volatility"] is None else f"%{Helper.format_price(values["volatility"])}"
+                min_price = "-" if values["min_price"] is None else Helper.format_price(values["min_price"])
+                max_price = "-" if values["max_price"] is None else Helper.format_price(values["max_price"])
+                vwap = "-" if values["vwap"] is None else Helper.format_price(values["vwap"])
+                lines.append(f"<b>{window} gün:</b>  {change}  |  {min_price} - {max_price} TL  |  "
+                             f"Oynaklık {volatility}  |  AOF {vwap} TL")
+
+            blocks.append("\n".join(lines))
+
+        return Helper.split_message(blocks, separator="\n\n")
+
+    @staticmethod
+    def split_message(blocks: list[str], separator: str,
+                      limit: int = telegram.constants.MessageLimit.MAX_TEXT_LENGTH) -> list[str]:
         """
-        message = ""
-
-        for name, group in groups.items():
-            min_price = f"{group["group_min_price"]:.2f}".replace(".", ",")
-            max_price = f"{group["group_max_price"]:.2f}".replace(".", ",")
-            avg_price = f"{group["group_avg_price"]:.2f}".replace(".", ",")
-            quantity = f"{group["group_quantity"]:,}".replace(",", ".")
-            emoji_pin = "\U0001F4CC"
-
-            message += f"{emoji_pin}  <u><b>{name}</b></u>  {emoji_pin}\n"
-            message += f"<b>En az:</b>   {min_price} TL\n"
-            message += f"<b>En fazla:</b>   {max_price} TL\n"
-            message += f"<b>Ortalama:</b>   {avg_price} TL\n"
-            message += f"<b>Miktar:</b>   {quantity} KG\n"
-            message += "\n\n"
-
-        return message
+        Joins the blocks into as few messages as possible without splitting any block, unless a single
+        block doesn't fit into a message on its own. Such a block is split between its lines, every HTML tag
+        is opened and closed on the same line, so the messages stay valid HTML.
+
+        Args:
+            blocks (list[str]): Pieces of text that should be kept together, e.g. a product group.
+            separator (str): Text to put between blocks of the same message.
+            limit (int): Maximum length of a message.
+
+        Returns:
+            list[str]: Messages that are at most limit characters long.
+
+        Raises:
+            ValueError: If a single line of a block is longer than limit.
+        """
+        pages = []
+        page = []
+        page_length = 0
+
+        for block in blocks:
+            if page and page_length + len(separator) + len(block) > limit:
+                pages.append(separator.join(page))
+                page = []
+                page_length = 0
+
+            if len(block) > limit:
+                lines = block.split("\n")
+
+                # Cutting a line anywhere else might split a tag or an entity, Telegram rejects such messages
+                if any(len(line) > limit for line in lines):
+                    raise ValueError(f"A line of the message is longer than {limit} characters: {block[:100]!r}")
+
+                pages.extend(Helper.split_message(lines, separator="\n", limit=limit))
+                continue
+
+            page_length += len(block) + (len(separator) if page else 0)
+            page.append(block)
+
+        if page:
+            pages.append(separator.join(page))
+
+        return pages
+
+    @staticmethod
+    def format_price(price: float) -> str:
+        return f"{price:.2f}".replace(".", ",")
+
+    @staticmethod
+    def _generate_price_card_text(title: str, min_price: float, max_price: float, avg_price: float,
+                                  quantity: int) -> str:
+        min_price = Helper.format_price(min_price)
+        max_price = Helper.format_price(max_price)
+        avg_price = Helper.format_price(avg_price)
+        quantity = f"{quantity:,}".replace(",", ".")
+        emoji_pin = "\U0001F4CC"
+
+        return (f"{emoji_pin}  {title}  {emoji_pin}\n"
+                f"<b>En az:</b>   {min_price} TL\n"
+                f"<b>En fazla:</b>   {max_price} TL\n"
+                f"<b>Ortalama:</b>   {avg_price} TL\n"
+                f"<b>Miktar:</b>   {quantity} KG")
 
     @staticmethod
     def generate_price_graph(data: list, days) -> BytesIO: